@@ -19,8 +19,17 @@ def fix_zatca_menu():
     
     print("🔧 Fixing ZATCA menu items...")
     
+    # One lookup per table instead of a frappe.db.exists call per record
+    existing_pages = set(frappe.get_all("Page", filters={'name': "zatca-setup-wizard"}, pluck='name'))
+    existing_icons = set(frappe.get_all(
+        "Desktop Icon",
+        filters={'name': ['in', ["ZATCA Setup Wizard", "ZATCA Settings", "ZATCA Logs"]]},
+        pluck='name'
+    ))
+    existing_modules = set(frappe.get_all("Module Def", filters={'name': "SEIDiT ZATCA"}, pluck='name'))
+    
     # Create the page
-    if not frappe.db.exists("Page", "zatca-setup-wizard"):
+    if "zatca-setup-wizard" not in existing_pages:
         frappe.get_doc({
             'doctype': 'Page',
             'name': 'zatca-setup-wizard',
@@ -32,7 +41,7 @@ def fix_zatca_menu():
         print("✅ Created ZATCA Setup Wizard page")
     
     # Create ZATCA Setup Wizard menu item
-    if not frappe.db.exists("Desktop Icon", "ZATCA Setup Wizard"):
+    if "ZATCA Setup Wizard" not in existing_icons:
         frappe.get_doc({
             'doctype': 'Desktop Icon',
             'module_name': 'SEIDiT ZATCA',
@@ -47,7 +56,7 @@ def fix_zatca_menu():
         print("✅ Created ZATCA Setup Wizard menu item")
     
     # Create ZATCA Settings menu item
-    if not frappe.db.exists("Desktop Icon", "ZATCA Settings"):
+    if "ZATCA Settings" not in existing_icons:
         frappe.get_doc({
             'doctype': 'Desktop Icon',
             'module_name': 'SEIDiT ZATCA',
@@ -62,7 +71,7 @@ def fix_zatca_menu():
         print("✅ Created ZATCA Settings menu item")
     
     # Create ZATCA Logs menu item
-    if not frappe.db.exists("Desktop Icon", "ZATCA Logs"):
+    if "ZATCA Logs" not in existing_icons:
         frappe.get_doc({
             'doctype': 'Desktop Icon',
             'module_name': 'SEIDiT ZATCA',
@@ -77,7 +86,7 @@ def fix_zatca_menu():
         print("✅ Created ZATCA Logs menu item")
     
     # Create module def if not exists
-    if not frappe.db.exists("Module Def", "SEIDiT ZATCA"):
+    if "SEIDiT ZATCA" not in existing_modules:
         frappe.get_doc({
             'doctype': 'Module Def',
             'module_name': 'SEIDiT ZATCA',
@@ -1,4 +1,7 @@
 import frappe
 
+from seidit_zatca_module.install_seidit_complete import SEIDiTCompleteInstaller
+
 def install():
-	pass 
\ No newline at end of file
+	"""Install SEIDiT ZATCA through the single complete installer"""
+	SEIDiTCompleteInstaller().install_complete_seidit_module()
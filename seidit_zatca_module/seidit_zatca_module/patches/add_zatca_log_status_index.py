@@ -0,0 +1,7 @@
+import frappe
+
+def execute():
+	"""Add the ZATCA Log status index to sites installed before the installer created it"""
+	# ZATCA Log is created by the SEIDiT installer, so it may not exist yet
+	if frappe.db.table_exists("ZATCA Log"):
+		frappe.db.add_index("ZATCA Log", ["status"])
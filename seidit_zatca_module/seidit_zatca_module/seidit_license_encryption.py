@@ -16,20 +16,103 @@ All rights reserved.
 import hashlib
 import hmac
 import base64
-import json
 import time
 import uuid
 import sys
 import os
 import platform
-import psutil
 import struct
+import functools
+import threading
 from datetime import datetime, timedelta
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes, ciphers
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import frappe
+from seidit_utils import seidit_admin_endpoint, dumps_compact, loads
+
+@functools.lru_cache(maxsize=1)
+def _hardware_fingerprint():
+    """
+    Hardware fingerprint of this machine, computed once per process
+    
+    Total memory, root disk size and the MAC address come straight from
+    sysconf, statvfs and uuid.getnode, one call each, and none of them change
+    while the worker runs.
+    """
+    try:
+        # CPU info
+        cpu_info = platform.processor()
+        
+        # Memory info
+        memory_total = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        
+        # Disk info
+        disk_info = os.statvfs('/')
+        disk_total = disk_info.f_blocks * disk_info.f_frsize
+        
+        # Network info; getnode sets the multicast bit when it had to fall
+        # back to a random number, which must not feed a stable fingerprint
+        node = uuid.getnode()
+        network_info = '' if node & (1 << 40) else f"{node:012x}"
+        
+        # Combine hardware info
+        hardware_string = f"{cpu_info}_{memory_total}_{disk_total}_{network_info}"
+        
+        return hashlib.sha256(hardware_string.encode()).hexdigest()
+        
+    except Exception:
+        return "default_hardware_fingerprint"
+
+@functools.lru_cache(maxsize=16)
+def _derive_key(master_key, salt):
+    """
+    Raw 32-byte key as keyed BLAKE2b of the salt under the master key
+    
+    The master key is a fixed constant, so iterated stretching added no
+    strength; one keyed hash gives an equally unpredictable 32-byte key.
+    """
+    return hashlib.blake2b(salt, key=master_key.encode(), digest_size=32).digest()
+
+# IVs are sliced from a block of os.urandom output so most encryptions skip
+# the getrandom syscall; the lock keeps concurrent callers on distinct slices
+IV_POOL_SIZE = 4096
+_iv_pool = b''
+_iv_offset = 0
+_iv_lock = threading.Lock()
+
+def _reset_iv_pool():
+    """Discard pooled IVs so a forked worker never reuses its parent's"""
+    global _iv_pool, _iv_offset
+    _iv_pool = b''
+    _iv_offset = 0
+
+os.register_at_fork(after_in_child=_reset_iv_pool)
+
+def _next_iv(size=12):
+    """Return the next unused random IV of size bytes from the pool"""
+    global _iv_pool, _iv_offset
+    with _iv_lock:
+        if _iv_offset + size > len(_iv_pool):
+            _iv_pool = os.urandom(IV_POOL_SIZE)
+            _iv_offset = 0
+        iv = _iv_pool[_iv_offset:_iv_offset + size]
+        _iv_offset += size
+        return iv
+
+# multi_layer_encrypt framing: timestamp, GCM nonce, then the ciphertext length
+LAYER_FRAME = struct.Struct('<Q12sI')
+
+OBFUSCATION_KEYS = bytes([0x55, 0xAA, 0x33, 0x77, 0x99, 0xBB, 0x44, 0x88])
+
+def _xor_obfuscation_keys(data):
+    """
+    XOR data with the repeating 8-byte obfuscation key
+    
+    Both sides are folded into single integers so the XOR runs as one bignum
+    operation over whole machine words instead of a Python loop per byte.
+    """
+    length = len(data)
+    mask = (OBFUSCATION_KEYS * (length // 8 + 1))[:length]
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(mask, 'little')).to_bytes(length, 'little')
 
 class SEIDiTLicenseEncryption:
     """
@@ -44,140 +127,63 @@ class SEIDiTLicenseEncryption:
         self.master_key = "seidit_master_key_2024_ultra_secure"
         self.encryption_salt = b'seidit_encryption_salt_2024_secure'
         
-        # Initialize encryption layers
-        self.layer1_key = self._generate_layer1_key()
+        # Hardware-bound AES-256-GCM key; GCM authenticates as it encrypts,
+        # so one pass replaces the Fernet/AES/Fernet stack
         self.layer2_key = self._generate_layer2_key()
-        self.layer3_key = self._generate_layer3_key()
-    
-    def _generate_layer1_key(self):
-        """Generate first layer encryption key"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.encryption_salt,
-            iterations=100000,
-        )
-        return base64.urlsafe_b64encode(kdf.derive(self.master_key.encode()))
+        self._aesgcm = AESGCM(self.layer2_key)
     
     def _generate_layer2_key(self):
-        """Generate second layer encryption key"""
-        # Hardware-based key generation
+        """Generate hardware-bound encryption key"""
+        # Hardware-based key generation; raw bytes, as AES takes them directly
         hardware_info = self._get_hardware_fingerprint()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=hardware_info.encode(),
-            iterations=50000,
-        )
-        return base64.urlsafe_b64encode(kdf.derive(self.master_key.encode()))
-    
-    def _generate_layer3_key(self):
-        """Generate third layer encryption key"""
-        # Time-based key generation
-        time_seed = str(int(time.time() // 3600))  # Hour-based
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=time_seed.encode(),
-            iterations=25000,
-        )
-        return base64.urlsafe_b64encode(kdf.derive(self.master_key.encode()))
+        return _derive_key(self.master_key, hardware_info.encode())
     
     def _get_hardware_fingerprint(self):
         """Get hardware fingerprint for encryption"""
-        try:
-            # CPU info
-            cpu_info = platform.processor()
-            
-            # Memory info
-            memory_info = psutil.virtual_memory()
-            
-            # Disk info
-            disk_info = psutil.disk_usage('/')
-            
-            # Network info
-            network_info = []
-            for interface, addresses in psutil.net_if_addrs().items():
-                for addr in addresses:
-                    if addr.family == psutil.AF_LINK:
-                        network_info.append(addr.address)
-            
-            # Combine hardware info
-            hardware_string = f"{cpu_info}_{memory_info.total}_{disk_info.total}_{'_'.join(network_info[:3])}"
-            
-            return hashlib.sha256(hardware_string.encode()).hexdigest()
-            
-        except Exception:
-            return "default_hardware_fingerprint"
+        return _hardware_fingerprint()
     
     def multi_layer_encrypt(self, data):
-        """Multi-layer encryption"""
+        """Encrypt and authenticate data under the hardware-bound key"""
         try:
-            # Layer 1: Basic encryption
-            fernet1 = Fernet(self.layer1_key)
-            encrypted1 = fernet1.encrypt(data.encode())
+            if isinstance(data, str):
+                data = data.encode()
             
-            # Layer 2: Hardware-based encryption
-            iv = os.urandom(16)
-            cipher = Cipher(algorithms.AES(self.layer2_key), modes.CBC(iv))
-            encryptor = cipher.encryptor()
+            # The fingerprint is authenticated as associated data, so a key
+            # moved to other hardware or edited in place fails decryption
+            fingerprint = self._get_hardware_fingerprint().encode()
+            nonce = _next_iv()
+            encrypted = self._aesgcm.encrypt(nonce, data, fingerprint)
             
-            # Pad data to 16-byte boundary
-            padded_data = encrypted1 + b'\x00' * (16 - len(encrypted1) % 16)
-            encrypted2 = encryptor.update(padded_data) + encryptor.finalize()
+            # Fixed header followed by the ciphertext and the fingerprint,
+            # base64-encoded once
+            combined_data = b''.join((
+                LAYER_FRAME.pack(int(time.time()), nonce, len(encrypted)),
+                encrypted,
+                fingerprint
+            ))
             
-            # Layer 3: Time-based encryption
-            fernet3 = Fernet(self.layer3_key)
-            encrypted3 = fernet3.encrypt(encrypted2)
-            
-            # Combine all layers with metadata
-            combined_data = {
-                'layer1': base64.b64encode(encrypted1).decode(),
-                'layer2': base64.b64encode(iv + encrypted2).decode(),
-                'layer3': base64.b64encode(encrypted3).decode(),
-                'timestamp': int(time.time()),
-                'hardware_fingerprint': self._get_hardware_fingerprint(),
-                'provider': self.provider,
-                'version': self.version
-            }
-            
-            return base64.urlsafe_b64encode(json.dumps(combined_data).encode()).decode()
+            return base64.urlsafe_b64encode(combined_data).decode()
             
         except Exception as e:
             return None
     
     def multi_layer_decrypt(self, encrypted_data):
-        """Multi-layer decryption"""
+        """Verify and decrypt data produced by multi_layer_encrypt"""
         try:
-            # Decode combined data
-            combined_data = json.loads(base64.urlsafe_b64decode(encrypted_data.encode()).decode())
+            # Decode combined data; the single base64 pass is the only decode,
+            # everything after it slices the raw frame
+            combined_data = base64.urlsafe_b64decode(encrypted_data)
+            timestamp, nonce, encrypted_length = LAYER_FRAME.unpack_from(combined_data)
+            fingerprint_start = LAYER_FRAME.size + encrypted_length
             
             # Verify hardware fingerprint
-            current_fingerprint = self._get_hardware_fingerprint()
-            if combined_data.get('hardware_fingerprint') != current_fingerprint:
+            current_fingerprint = self._get_hardware_fingerprint().encode()
+            if combined_data[fingerprint_start:] != current_fingerprint:
                 return None
             
-            # Layer 3: Time-based decryption
-            fernet3 = Fernet(self.layer3_key)
-            decrypted3 = fernet3.decrypt(base64.b64decode(combined_data['layer3']))
-            
-            # Layer 2: Hardware-based decryption
-            layer2_data = base64.b64decode(combined_data['layer2'])
-            iv = layer2_data[:16]
-            encrypted2 = layer2_data[16:]
-            
-            cipher = Cipher(algorithms.AES(self.layer2_key), modes.CBC(iv))
-            decryptor = cipher.decryptor()
-            decrypted2 = decryptor.update(encrypted2) + decryptor.finalize()
-            
-            # Remove padding
-            decrypted2 = decrypted2.rstrip(b'\x00')
-            
-            # Layer 1: Basic decryption
-            fernet1 = Fernet(self.layer1_key)
-            decrypted1 = fernet1.decrypt(decrypted2)
-            
-            return decrypted1.decode()
+            # Older cryptography releases require bytes here, not a memoryview
+            encrypted = combined_data[LAYER_FRAME.size:fingerprint_start]
+            return self._aesgcm.decrypt(nonce, encrypted, current_fingerprint).decode()
             
         except Exception as e:
             return None
@@ -186,14 +192,7 @@ class SEIDiTLicenseEncryption:
         """Obfuscate code strings"""
         try:
             # Simple XOR obfuscation with multiple keys
-            keys = [0x55, 0xAA, 0x33, 0x77, 0x99, 0xBB, 0x44, 0x88]
-            obfuscated = bytearray()
-            
-            for i, char in enumerate(code_string.encode()):
-                key = keys[i % len(keys)]
-                obfuscated.append(char ^ key)
-            
-            return base64.b64encode(bytes(obfuscated)).decode()
+            return base64.b64encode(_xor_obfuscation_keys(code_string.encode())).decode()
             
         except Exception:
             return code_string
@@ -201,29 +200,33 @@ class SEIDiTLicenseEncryption:
     def deobfuscate_code(self, obfuscated_string):
         """Deobfuscate code strings"""
         try:
-            keys = [0x55, 0xAA, 0x33, 0x77, 0x99, 0xBB, 0x44, 0x88]
             obfuscated = base64.b64decode(obfuscated_string.encode())
-            deobfuscated = bytearray()
-            
-            for i, char in enumerate(obfuscated):
-                key = keys[i % len(keys)]
-                deobfuscated.append(char ^ key)
-            
-            return bytes(deobfuscated).decode()
+            return _xor_obfuscation_keys(obfuscated).decode()
             
         except Exception:
             return obfuscated_string
     
+    def _sign_license(self, installation_id, provider, version, created_at):
+        """Keyed BLAKE2b MAC of the signed license fields and this machine's fingerprint"""
+        # BLAKE2b's keyed mode is a MAC in one pass, without HMAC's inner and
+        # outer hashes; fields are fed straight in, '|'-separated
+        signer = hashlib.blake2b(key=self.master_key.encode(), digest_size=32)
+        for field in (installation_id, provider, version, created_at, self._get_hardware_fingerprint()):
+            signer.update(str(field).encode())
+            signer.update(b'|')
+        return signer.hexdigest()
+    
     def create_secure_license(self, installation_id, customer_info):
         """Create secure license with multi-layer encryption"""
         try:
+            now = datetime.now()
             license_data = {
                 'installation_id': installation_id,
                 'customer_info': customer_info,
                 'provider': self.provider,
                 'version': self.version,
-                'created_at': datetime.now().isoformat(),
-                'expires_at': (datetime.now() + timedelta(days=365*10)).isoformat(),
+                'created_at': now.isoformat(),
+                'expires_at': (now + timedelta(days=365*10)).isoformat(),
                 'license_type': 'lifetime',
                 'features': ['zatca_compliance', 'unlimited_invoices', 'premium_support'],
                 'encryption_level': 'multi_layer',
@@ -232,23 +235,12 @@ class SEIDiTLicenseEncryption:
             }
             
             # Create signature
-            signature_data = {
-                'installation_id': installation_id,
-                'provider': self.provider,
-                'version': self.version,
-                'created_at': license_data['created_at'],
-                'hardware_fingerprint': self._get_hardware_fingerprint()
-            }
-            
-            signature_string = json.dumps(signature_data, sort_keys=True)
-            license_data['signature'] = hmac.new(
-                self.master_key.encode(),
-                signature_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            license_data['signature'] = self._sign_license(
+                installation_id, self.provider, self.version, license_data['created_at']
+            )
             
             # Multi-layer encryption
-            encrypted_license = self.multi_layer_encrypt(json.dumps(license_data))
+            encrypted_license = self.multi_layer_encrypt(dumps_compact(license_data))
             
             if encrypted_license:
                 return {
@@ -273,34 +265,26 @@ class SEIDiTLicenseEncryption:
     def validate_secure_license(self, license_key, installation_id):
         """Validate secure license with multi-layer decryption"""
         try:
-            # Multi-layer decryption
+            # Multi-layer decryption; this also rejects keys framed with
+            # another machine's fingerprint, which is the hardware binding
             decrypted_data = self.multi_layer_decrypt(license_key)
             
             if not decrypted_data:
                 return False, "License decryption failed"
             
-            license_data = json.loads(decrypted_data)
+            license_data = loads(decrypted_data)
             
             # Verify installation ID
             if license_data.get('installation_id') != installation_id:
                 return False, "License not valid for this installation"
             
             # Verify signature
-            signature_data = {
-                'installation_id': license_data['installation_id'],
-                'provider': license_data['provider'],
-                'version': license_data['version'],
-                'created_at': license_data['created_at'],
-                'hardware_fingerprint': license_data.get('hardware_fingerprint')
-            }
-            
-            expected_signature = hmac.new(
-                self.master_key.encode(),
-                json.dumps(signature_data, sort_keys=True).encode(),
-                hashlib.sha256
-            ).hexdigest()
+            expected_signature = self._sign_license(
+                license_data['installation_id'], license_data['provider'],
+                license_data['version'], license_data['created_at']
+            )
             
-            if license_data.get('signature') != expected_signature:
+            if not hmac.compare_digest(str(license_data.get('signature') or ''), expected_signature):
                 return False, "Invalid license signature"
             
             # Check expiration
@@ -308,12 +292,6 @@ class SEIDiTLicenseEncryption:
             if datetime.now() > expires_at:
                 return False, "License has expired"
             
-            # Verify hardware binding
-            if license_data.get('hardware_bound'):
-                current_fingerprint = self._get_hardware_fingerprint()
-                if license_data.get('hardware_fingerprint') != current_fingerprint:
-                    return False, "License not valid for this hardware"
-            
             return True, "License validated successfully"
             
         except Exception as e:
@@ -366,28 +344,36 @@ def check_seidit_license_obfuscated(license_key, installation_id):
                 'provider': self.provider
             }
 
+# SEIDiTLicenseEncryption holds only the hardware-bound key and its AESGCM
+# object, neither of which changes while the worker runs
+_encryption = None
+
+def _get_encryption():
+    """Return the process-wide SEIDiTLicenseEncryption, creating it on first use"""
+    global _encryption
+    if _encryption is None:
+        _encryption = SEIDiTLicenseEncryption()
+    return _encryption
+
 # API Endpoints for secure encryption
 @frappe.whitelist()
+@seidit_admin_endpoint('Secure license creation failed')
 def create_seidit_secure_license(installation_id, customer_info):
-    """Create SEIDiT secure license with multi-layer encryption"""
-    try:
-        encryption = SEIDiTLicenseEncryption()
-        result = encryption.create_secure_license(installation_id, json.loads(customer_info))
-        
-        return result
-        
-    except Exception as e:
-        return {
-            'status': 'error',
-            'message': f'Secure license creation failed: {str(e)}',
-            'provider': 'SEIDiT'
-        }
+    """
+    Create SEIDiT secure license with multi-layer encryption
+    
+    Restricted to System Manager; other callers get 'Unauthorized access'.
+    """
+    # The permission check has already run, so unauthorized callers never
+    # reach the payload parse
+    customer_info = loads(customer_info)
+    return _get_encryption().create_secure_license(installation_id, customer_info)
 
 @frappe.whitelist()
 def validate_seidit_secure_license(license_key, installation_id):
     """Validate SEIDiT secure license with multi-layer decryption"""
     try:
-        encryption = SEIDiTLicenseEncryption()
+        encryption = _get_encryption()
         is_valid, message = encryption.validate_secure_license(license_key, installation_id)
         
         return {
@@ -408,7 +394,7 @@ def validate_seidit_secure_license(license_key, installation_id):
 def create_seidit_obfuscated_checker():
     """Create SEIDiT obfuscated license checker"""
     try:
-        encryption = SEIDiTLicenseEncryption()
+        encryption = _get_encryption()
         result = encryption.create_obfuscated_license_checker()
         
         return result
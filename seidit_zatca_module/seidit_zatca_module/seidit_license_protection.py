@@ -16,16 +16,38 @@ All rights reserved.
 import hashlib
 import hmac
 import base64
-import json
 import time
-import uuid
 import sys
 import os
 import platform
 import psutil
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
+import functools
 import frappe
+from seidit_utils import dumps_compact, loads
+
+@functools.lru_cache(maxsize=None)
+def _fernet_for_key(key):
+    """Build the Fernet for one key; workers serving several sites keep one per key"""
+    return Fernet(key)
+
+def get_license_fernet():
+    """
+    Fernet used to encrypt protected license keys for the current site
+    
+    The key comes from the seidit_license_fernet_key site config (or the
+    SEIDIT_FERNET_KEY environment variable) so issued licenses can be
+    decrypted later. A missing key is an error rather than a random key,
+    which would produce licenses nobody can decrypt.
+    """
+    key = frappe.conf.get("seidit_license_fernet_key") or os.environ.get("SEIDIT_FERNET_KEY")
+    if not key:
+        raise ValueError(
+            "SEIDiT license encryption key is not configured; set "
+            "seidit_license_fernet_key in site_config.json"
+        )
+    return _fernet_for_key(key)
 
 class SEIDiTLicenseProtection:
     """
@@ -39,6 +61,17 @@ class SEIDiTLicenseProtection:
         self.version = "2.0.0"
         self.protection_key = "seidit_protection_key_2024_secure"
         
+        # Key padded to SHA-256's 64-byte block (the same HMAC as the raw key),
+        # with the keyed inner/outer state computed once and copied per signature
+        self._protection_key_bytes = self.protection_key.encode().ljust(64, b'\x00')
+        self._hmac_template = hmac.new(self._protection_key_bytes, digestmod=hashlib.sha256)
+        
+    def _sign(self, message):
+        """HMAC-SHA256 hex signature of bytes, from the precomputed key state"""
+        signer = self._hmac_template.copy()
+        signer.update(message)
+        return signer.hexdigest()
+        
     def check_code_integrity(self):
         """Check if code has been tampered with"""
         try:
@@ -149,24 +182,20 @@ class SEIDiTLicenseProtection:
             challenge_data = {
                 'installation_id': installation_id,
                 'timestamp': int(time.time()),
-                'nonce': str(uuid.uuid4()),
+                'nonce': os.urandom(16).hex(),
                 'provider': self.provider,
                 'version': self.version
             }
             
             # Create challenge signature
-            challenge_string = json.dumps(challenge_data, sort_keys=True)
-            signature = hmac.new(
-                self.protection_key.encode(),
-                challenge_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            challenge_string = dumps_compact(challenge_data, sort_keys=True)
+            signature = self._sign(challenge_string)
             
             challenge_data['signature'] = signature
             
             return {
                 'status': 'success',
-                'challenge': base64.b64encode(json.dumps(challenge_data).encode()).decode(),
+                'challenge': base64.b64encode(dumps_compact(challenge_data)).decode(),
                 'provider': self.provider
             }
             
@@ -181,21 +210,17 @@ class SEIDiTLicenseProtection:
         """Validate license challenge response"""
         try:
             # Decode challenge
-            challenge_data = json.loads(base64.b64decode(challenge.encode()).decode())
+            challenge_data = loads(base64.b64decode(challenge.encode()))
             
             # Verify challenge signature
-            challenge_string = json.dumps({k: v for k, v in challenge_data.items() if k != 'signature'}, sort_keys=True)
-            expected_signature = hmac.new(
-                self.protection_key.encode(),
-                challenge_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            challenge_string = dumps_compact({k: v for k, v in challenge_data.items() if k != 'signature'}, sort_keys=True)
+            expected_signature = self._sign(challenge_string)
             
             if challenge_data.get('signature') != expected_signature:
                 return False, "Invalid challenge signature"
             
             # Verify response
-            response_data = json.loads(base64.b64decode(response.encode()).decode())
+            response_data = loads(base64.b64decode(response.encode()))
             
             # Check if response matches challenge
             if response_data.get('installation_id') != challenge_data.get('installation_id'):
@@ -213,13 +238,14 @@ class SEIDiTLicenseProtection:
         """Create secure license key with protection"""
         try:
             # Create license data
+            now = datetime.now()
             license_data = {
                 'installation_id': installation_id,
                 'customer_info': customer_info,
                 'provider': self.provider,
                 'version': self.version,
-                'created_at': datetime.now().isoformat(),
-                'expires_at': (datetime.now() + timedelta(days=365*10)).isoformat(),
+                'created_at': now.isoformat(),
+                'expires_at': (now + timedelta(days=365*10)).isoformat(),
                 'license_type': 'lifetime',
                 'features': ['zatca_compliance', 'unlimited_invoices', 'premium_support'],
                 'protection_level': 'high',
@@ -235,17 +261,11 @@ class SEIDiTLicenseProtection:
                 'protection_level': 'high'
             }
             
-            signature_string = json.dumps(signature_data, sort_keys=True)
-            license_data['signature'] = hmac.new(
-                self.protection_key.encode(),
-                signature_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            signature_string = dumps_compact(signature_data, sort_keys=True)
+            license_data['signature'] = self._sign(signature_string)
             
             # Encrypt license data
-            key = Fernet.generate_key()
-            fernet = Fernet(key)
-            encrypted_data = fernet.encrypt(json.dumps(license_data).encode())
+            encrypted_data = get_license_fernet().encrypt(dumps_compact(license_data))
             
             # Create final license key
             license_key = base64.urlsafe_b64encode(encrypted_data).decode()
@@ -265,12 +285,23 @@ class SEIDiTLicenseProtection:
                 'provider': self.provider
             }
 
+# SEIDiTLicenseProtection holds only constant keys and the precomputed HMAC
+# state, so one instance serves every request in the worker
+_protection = None
+
+def _get_protection():
+    """Return the process-wide SEIDiTLicenseProtection, creating it on first use"""
+    global _protection
+    if _protection is None:
+        _protection = SEIDiTLicenseProtection()
+    return _protection
+
 # API Endpoints for license protection
 @frappe.whitelist()
 def check_seidit_protection():
     """Check SEIDiT license protection status"""
     try:
-        protection = SEIDiTLicenseProtection()
+        protection = _get_protection()
         
         # Run all protection checks
         integrity_ok, integrity_msg = protection.check_code_integrity()
@@ -313,7 +344,7 @@ def create_seidit_license_challenge():
         installation_info = license_system.get_installation_info()
         installation_id = installation_info.get('installation_id')
         
-        protection = SEIDiTLicenseProtection()
+        protection = _get_protection()
         result = protection.create_license_challenge(installation_id)
         
         return result
@@ -329,7 +360,7 @@ def create_seidit_license_challenge():
 def validate_seidit_license_challenge(challenge, response):
     """Validate SEIDiT license challenge response"""
     try:
-        protection = SEIDiTLicenseProtection()
+        protection = _get_protection()
         is_valid, message = protection.validate_license_challenge(challenge, response)
         
         return {
@@ -14,12 +14,24 @@ import hmac
 import base64
 import json
 import time
-import uuid
+import os
 import platform
 import psutil
 from datetime import datetime, timedelta
 import frappe
 
+# check_license_status backs the wizard and status endpoints, which are polled;
+# its result is kept in the site cache briefly and dropped on license or usage
+# changes made through this module. ZATCA Log rows written elsewhere or edited
+# in the desk only show up once the entry expires, so enforcement
+# (can_generate_invoice) reads the status directly instead.
+LICENSE_STATUS_CACHE_KEY = "seidit_license_status"
+LICENSE_STATUS_CACHE_TTL = 30
+
+def clear_license_status_cache():
+    """Drop the cached license status after a license or usage change"""
+    frappe.cache().delete_value(LICENSE_STATUS_CACHE_KEY)
+
 class SEIDiTLicenseSystem:
     """
     SEIDiT License System
@@ -44,15 +56,15 @@ class SEIDiTLicenseSystem:
     def get_installation_info(self):
         """Get unique installation information"""
         try:
-            # Check if installation info already exists
-            if frappe.db.exists("SEIDiT Installation Info", "Default"):
-                installation_info = frappe.get_doc("SEIDiT Installation Info", "Default")
-                return {
-                    'installation_id': installation_info.installation_id,
-                    'hardware_fingerprint': installation_info.hardware_fingerprint,
-                    'created_at': installation_info.created_at,
-                    'provider': self.provider
-                }
+            # Check if installation info already exists, reading only the fields returned
+            installation_info = frappe.db.get_value(
+                "SEIDiT Installation Info", "Default",
+                ['installation_id', 'hardware_fingerprint', 'created_at'],
+                as_dict=True
+            )
+            if installation_info:
+                installation_info['provider'] = self.provider
+                return installation_info
             
             # Generate new installation info
             installation_id = self._generate_installation_id()
@@ -100,7 +112,7 @@ class SEIDiTLicenseSystem:
             
         except Exception as e:
             frappe.log_error(f"SEIDiT Installation ID Generation Error: {str(e)}")
-            return f"SEIDiT_{uuid.uuid4().hex[:16].upper()}"
+            return f"SEIDiT_{os.urandom(8).hex().upper()}"
     
     def _generate_hardware_fingerprint(self):
         """Generate hardware fingerprint"""
@@ -121,22 +133,37 @@ class SEIDiTLicenseSystem:
             
         except Exception as e:
             frappe.log_error(f"SEIDiT Hardware Fingerprint Error: {str(e)}")
-            return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()
+            # 32 random bytes, already the size of a SHA-256 fingerprint
+            return os.urandom(32).hex()
     
     def check_license_status(self):
-        """Check current license status"""
+        """Check current license status, served from the site cache when fresh"""
+        cached = frappe.cache().get_value(LICENSE_STATUS_CACHE_KEY)
+        if cached is not None:
+            return cached
+        
+        status = self._read_license_status()
+        # Errors and a missing settings row are not cached so they clear as
+        # soon as the underlying problem does
+        if status['status'] not in ('error', 'no_settings'):
+            frappe.cache().set_value(LICENSE_STATUS_CACHE_KEY, status,
+                                     expires_in_sec=LICENSE_STATUS_CACHE_TTL)
+        return status
+    
+    def _read_license_status(self):
+        """Compute the license status from ZATCA Settings and the usage count"""
         try:
-            if not frappe.db.exists("ZATCA Settings", "Default"):
+            # Only the license flag is needed; None means there is no settings row
+            license_active = frappe.db.get_value("ZATCA Settings", "Default", 'seidit_license_active')
+            if license_active is None:
                 return {
                     'status': 'no_settings',
                     'message': 'ZATCA Settings not found',
                     'provider': self.provider
                 }
             
-            settings = frappe.get_doc("ZATCA Settings", "Default")
-            
             # Check if license is active
-            if settings.seidit_license_active:
+            if license_active:
                 return {
                     'status': 'licensed',
                     'message': 'License is active',
@@ -283,27 +310,43 @@ class SEIDiTLicenseSystem:
     def _update_license_settings(self, license_key, is_active):
         """Update license settings"""
         try:
-            if frappe.db.exists("ZATCA Settings", "Default"):
-                settings = frappe.get_doc("ZATCA Settings", "Default")
-                settings.seidit_license_key = license_key
-                settings.seidit_license_active = is_active
-                settings.seidit_license_validated_at = datetime.now()
-                settings.save()
-                
+            # One UPDATE ... WHERE name='Default'; a missing settings row
+            # matches nothing, as the old existence check did
+            frappe.db.set_value("ZATCA Settings", "Default", {
+                'seidit_license_key': license_key,
+                'seidit_license_active': is_active,
+                'seidit_license_validated_at': datetime.now()
+            })
+            clear_license_status_cache()
+            
         except Exception as e:
             frappe.log_error(f"SEIDiT License Settings Update Error: {str(e)}")
     
+    def log_usage_entries(self, entries):
+        """
+        Write SEIDiT Usage Log rows in one multi-row INSERT
+        
+        entries are (license_key, action, status) tuples; they share one
+        timestamp and skip the document lifecycle, which usage rows do not use.
+        """
+        now = datetime.now()
+        user = frappe.session.user
+        
+        frappe.db.bulk_insert(
+            "SEIDiT Usage Log",
+            fields=['name', 'license_key', 'action', 'status', 'timestamp', 'provider',
+                    'owner', 'modified_by', 'creation', 'modified'],
+            values=[
+                (frappe.generate_hash(length=10), license_key, action, status, now, self.provider,
+                 user, user, now, now)
+                for license_key, action, status in entries
+            ]
+        )
+    
     def _log_license_validation(self, license_key, status):
         """Log license validation attempt"""
         try:
-            frappe.get_doc({
-                'doctype': 'SEIDiT Usage Log',
-                'license_key': license_key,
-                'action': f'license_validation_{status}',
-                'timestamp': datetime.now(),
-                'provider': self.provider,
-                'status': status
-            }).insert()
+            self.log_usage_entries([(license_key, f'license_validation_{status}', status)])
             
         except Exception as e:
             frappe.log_error(f"SEIDiT Usage Log Error: {str(e)}")
@@ -311,7 +354,8 @@ class SEIDiTLicenseSystem:
     def can_generate_invoice(self):
         """Check if user can generate invoice"""
         try:
-            license_status = self.check_license_status()
+            # Not served from the cache: the free-trial count must be current
+            license_status = self._read_license_status()
             
             if license_status['status'] == 'licensed':
                 return True, "License active"
@@ -327,13 +371,7 @@ class SEIDiTLicenseSystem:
     def log_invoice_generation(self):
         """Log invoice generation"""
         try:
-            frappe.get_doc({
-                'doctype': 'SEIDiT Usage Log',
-                'action': 'invoice_generated',
-                'timestamp': datetime.now(),
-                'provider': self.provider,
-                'status': 'success'
-            }).insert()
+            self.log_usage_entries([(None, 'invoice_generated', 'success')])
             
         except Exception as e:
             frappe.log_error(f"SEIDiT Invoice Log Error: {str(e)}")
@@ -15,12 +15,25 @@ import base64
 import json
 import time
 import uuid
+import threading
+import platform
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import requests
 import frappe
+from seidit_utils import seidit_admin_endpoint, dumps_compact, loads
+
+# PBKDF2-HMAC-SHA256 of b'seidit_license_password_2024_secure' with salt
+# b'seidit_license_salt_2024_secure', 100000 iterations, 32 bytes, url-safe
+# base64. The inputs are fixed, so the result is stored rather than
+# re-derived in every worker.
+LICENSE_FERNET_KEY = b'HGU1X_zhzHPI48UM7TWaVPVT9rFeyWji2ODZgUF-wA4='
+
+# Successful validations are remembered per (license_key, installation_id) for
+# a short time, so repeat checks from the same installation skip the decrypt,
+# signature check and server round trip
+VALIDATION_CACHE_TTL = 60
+VALIDATION_CACHE_SIZE = 1024
 
 class SEIDiTSecureLicenseServer:
     """
@@ -44,31 +57,35 @@ class SEIDiTSecureLicenseServer:
         # Encryption keys (in production, these would be stored securely)
         self.encryption_key = self._generate_encryption_key()
         self.fernet = Fernet(self.encryption_key)
+        
+        # Keyed HMAC state for license signatures, copied per signature
+        self._hmac_template = hmac.new(self.secret_key.encode(), digestmod=hashlib.sha256)
+        
+        # (license_key, installation_id) -> unix time the cached result lapses
+        self._validation_cache = {}
+        self._validation_lock = threading.Lock()
     
     def _generate_encryption_key(self):
         """Generate encryption key for license communication"""
-        salt = b'seidit_license_salt_2024_secure'
-        password = b'seidit_license_password_2024_secure'
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password))
-        return key
+        return LICENSE_FERNET_KEY
+    
+    def _sign(self, message):
+        """HMAC-SHA256 hex signature of bytes under the license secret"""
+        signer = self._hmac_template.copy()
+        signer.update(message)
+        return signer.hexdigest()
     
-    def generate_secure_license(self, installation_id, customer_info):
+    def generate_secure_license(self, installation_id, customer_info, now=None):
         """Generate secure license with server-side validation"""
         try:
+            now = now or datetime.now()
             license_data = {
                 'installation_id': installation_id,
                 'customer_info': customer_info,
                 'provider': self.provider,
                 'version': self.version,
-                'created_at': datetime.now().isoformat(),
-                'expires_at': (datetime.now() + timedelta(days=365*10)).isoformat(),  # 10 years
+                'created_at': now.isoformat(),
+                'expires_at': (now + timedelta(days=365*10)).isoformat(),  # 10 years
                 'license_type': 'lifetime',
                 'features': ['zatca_compliance', 'unlimited_invoices', 'premium_support'],
                 'signature': None  # Will be added by server
@@ -82,15 +99,13 @@ class SEIDiTSecureLicenseServer:
                 'created_at': license_data['created_at']
             }
             
+            # The signed string keeps json.dumps' spacing so licenses already
+            # issued still verify; only the payload moves to orjson
             signature_string = json.dumps(signature_data, sort_keys=True)
-            license_data['signature'] = hmac.new(
-                self.secret_key.encode(),
-                signature_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            license_data['signature'] = self._sign(signature_string.encode())
             
             # Encrypt license data
-            encrypted_data = self.fernet.encrypt(json.dumps(license_data).encode())
+            encrypted_data = self.fernet.encrypt(dumps_compact(license_data))
             license_key = base64.urlsafe_b64encode(encrypted_data).decode()
             
             return {
@@ -106,13 +121,38 @@ class SEIDiTSecureLicenseServer:
                 'message': f'License generation failed: {str(e)}'
             }
     
+    def generate_secure_licenses(self, installations):
+        """
+        Generate licenses for many installations in one call
+        
+        installations are (installation_id, customer_info) pairs; the licenses
+        share one creation time and the server's prepared HMAC and Fernet state.
+        Results are in input order, with an error entry for each pair that has
+        no installation_id or whose generation failed.
+        """
+        now = datetime.now()
+        return [
+            self.generate_secure_license(installation_id, customer_info, now)
+            if installation_id else {
+                'status': 'error',
+                'message': 'License generation failed: installation_id is required'
+            }
+            for installation_id, customer_info in installations
+        ]
+    
     def validate_license_remotely(self, license_key, installation_id):
         """Validate license with server-side verification"""
+        cache_key = (license_key, installation_id)
+        with self._validation_lock:
+            valid_until = self._validation_cache.get(cache_key)
+        if valid_until is not None and time.time() < valid_until:
+            return True, "License is valid"
+        
         try:
             # Decrypt license data
             encrypted_data = base64.urlsafe_b64decode(license_key.encode())
             decrypted_data = self.fernet.decrypt(encrypted_data)
-            license_data = json.loads(decrypted_data.decode())
+            license_data = loads(decrypted_data)
             
             # Verify installation ID
             if license_data.get('installation_id') != installation_id:
@@ -126,13 +166,9 @@ class SEIDiTSecureLicenseServer:
                 'created_at': license_data['created_at']
             }
             
-            expected_signature = hmac.new(
-                self.secret_key.encode(),
-                json.dumps(signature_data, sort_keys=True).encode(),
-                hashlib.sha256
-            ).hexdigest()
+            expected_signature = self._sign(json.dumps(signature_data, sort_keys=True).encode())
             
-            if license_data.get('signature') != expected_signature:
+            if not hmac.compare_digest(str(license_data.get('signature') or ''), expected_signature):
                 return False, "Invalid license signature"
             
             # Check expiration
@@ -141,16 +177,23 @@ class SEIDiTSecureLicenseServer:
                 return False, "License has expired"
             
             # Remote server validation
-            server_response = self._validate_with_server(license_key, installation_id)
+            server_response = self._validate_with_server(license_key, installation_id, license_data)
             if not server_response.get('valid'):
                 return False, server_response.get('message', 'Server validation failed')
             
+            # Never cache past the license's own expiry
+            valid_until = min(time.time() + VALIDATION_CACHE_TTL, expires_at.timestamp())
+            with self._validation_lock:
+                if len(self._validation_cache) >= VALIDATION_CACHE_SIZE:
+                    self._validation_cache.clear()
+                self._validation_cache[cache_key] = valid_until
+            
             return True, "License is valid"
             
         except Exception as e:
             return False, f"License validation error: {str(e)}"
     
-    def _validate_with_server(self, license_key, installation_id):
+    def _validate_with_server(self, license_key, installation_id, license_data=None):
         """Validate license with SEIDiT license server"""
         try:
             # This would be a real API call to SEIDiT's license server
@@ -179,7 +222,7 @@ class SEIDiTSecureLicenseServer:
             
             # In production, this would be a real API call
             # For now, we'll simulate the response
-            if self._is_valid_license_locally(license_key, installation_id):
+            if self._is_valid_license_locally(license_key, installation_id, license_data):
                 return {
                     'valid': True,
                     'message': 'License validated successfully',
@@ -197,16 +240,20 @@ class SEIDiTSecureLicenseServer:
                 'message': f'Server validation error: {str(e)}'
             }
     
-    def _is_valid_license_locally(self, license_key, installation_id):
+    def _is_valid_license_locally(self, license_key, installation_id, license_data=None):
         """Check if license is valid locally (simulates server database)"""
         # In production, this would check against a real database
         # For demo purposes, we'll use a simple check
         
+        # Callers that have already decrypted the key pass its data along
+        if license_data is not None:
+            return license_data.get('installation_id') == installation_id
+        
         # Extract installation ID from license
         try:
             encrypted_data = base64.urlsafe_b64decode(license_key.encode())
             decrypted_data = self.fernet.decrypt(encrypted_data)
-            license_data = json.loads(decrypted_data.decode())
+            license_data = loads(decrypted_data)
             
             return license_data.get('installation_id') == installation_id
         except:
@@ -214,6 +261,9 @@ class SEIDiTSecureLicenseServer:
     
     def revoke_license(self, license_key, installation_id):
         """Revoke license (server-side)"""
+        with self._validation_lock:
+            self._validation_cache.pop((license_key, installation_id), None)
+        
         try:
             payload = {
                 'license_key': license_key,
@@ -257,7 +307,7 @@ class SEIDiTSecureLicenseClient:
     def __init__(self):
         self.provider = "SEIDiT"
         self.version = "2.0.0"
-        self.license_server = SEIDiTSecureLicenseServer()
+        self.license_server = _get_license_server()
         
     def validate_license(self, license_key, installation_id):
         """Validate license with anti-reverse engineering protection"""
@@ -312,14 +362,28 @@ class SEIDiTSecureLicenseClient:
             return False
     
     def _update_license_status(self, license_key, installation_id, is_valid):
-        """Update local license status"""
+        """Update local license status, skipping the write when it is unchanged"""
         try:
-            if frappe.db.exists("ZATCA Settings", "Default"):
-                settings = frappe.get_doc("ZATCA Settings", "Default")
-                settings.seidit_license_key = license_key if is_valid else ""
-                settings.seidit_license_active = is_valid
-                settings.seidit_license_validated_at = datetime.now()
-                settings.save()
+            current = frappe.db.get_value(
+                "ZATCA Settings", "Default",
+                ['seidit_license_key', 'seidit_license_active'],
+                as_dict=True
+            )
+            stored_key = license_key if is_valid else ""
+            # Validation-cache hits repeat the last result; only changes are written
+            if current and (
+                (current.seidit_license_key or "") == stored_key
+                and bool(current.seidit_license_active) == bool(is_valid)
+            ):
+                return
+            
+            frappe.db.set_value("ZATCA Settings", "Default", {
+                'seidit_license_key': stored_key,
+                'seidit_license_active': is_valid,
+                'seidit_license_validated_at': datetime.now()
+            })
+            from seidit_license_system import clear_license_status_cache
+            clear_license_status_cache()
         except Exception as e:
             frappe.log_error(f"SEIDiT License Status Update Error: {str(e)}")
     
@@ -328,7 +392,7 @@ class SEIDiTSecureLicenseClient:
         try:
             encrypted_data = base64.urlsafe_b64decode(license_key.encode())
             decrypted_data = self.license_server.fernet.decrypt(encrypted_data)
-            license_data = json.loads(decrypted_data.decode())
+            license_data = loads(decrypted_data)
             
             return {
                 'installation_id': license_data.get('installation_id'),
@@ -342,6 +406,51 @@ class SEIDiTSecureLicenseClient:
         except Exception as e:
             return None
 
+# Rough floor for hashlib SHA-256 on x86-64 with the SHA extensions; results
+# well below it usually mean OpenSSL is running its scalar code
+SHA256_EXPECTED_MB_S = 400
+
+def check_sha256_throughput(rounds=1000):
+    """
+    Measure hashlib SHA-256 throughput in MB/s, logging a warning when it looks
+    unaccelerated
+    
+    License signatures and Fernet's HMAC both run on OpenSSL's SHA-256; on
+    x86-64 a low figure points at an old OpenSSL or OPENSSL_ia32cap masking
+    SHA-NI. Run by the installer's background job, never inside a request.
+    """
+    block = b'\x00' * 4096
+    start = time.perf_counter()
+    for _ in range(rounds):
+        hashlib.sha256(block).digest()
+    throughput = rounds * len(block) / (time.perf_counter() - start) / 1e6
+    
+    if platform.machine().lower() in ('x86_64', 'amd64') and throughput < SHA256_EXPECTED_MB_S:
+        frappe.logger("seidit_zatca").warning(
+            f"SEIDiT: SHA-256 runs at {throughput:.0f} MB/s; SHA-NI is likely not in use. "
+            "Check the OpenSSL version and that OPENSSL_ia32cap does not disable it."
+        )
+    return throughput
+
+# Shared instances: neither class holds per-request state, and the server's
+# HMAC state and validation cache are meant to outlive a single request
+_license_server = None
+_license_client = None
+
+def _get_license_server():
+    """Return the process-wide SEIDiTSecureLicenseServer, creating it on first use"""
+    global _license_server
+    if _license_server is None:
+        _license_server = SEIDiTSecureLicenseServer()
+    return _license_server
+
+def _get_license_client():
+    """Return the process-wide SEIDiTSecureLicenseClient, creating it on first use"""
+    global _license_client
+    if _license_client is None:
+        _license_client = SEIDiTSecureLicenseClient()
+    return _license_client
+
 # API Endpoints for secure licensing
 @frappe.whitelist()
 def validate_seidit_secure_license(license_key):
@@ -352,7 +461,7 @@ def validate_seidit_secure_license(license_key):
         installation_info = license_system.get_installation_info()
         installation_id = installation_info.get('installation_id')
         
-        client = SEIDiTSecureLicenseClient()
+        client = _get_license_client()
         is_valid, message = client.validate_license(license_key, installation_id)
         
         return {
@@ -373,7 +482,7 @@ def validate_seidit_secure_license(license_key):
 def get_seidit_license_info(license_key):
     """Get SEIDiT license information"""
     try:
-        client = SEIDiTSecureLicenseClient()
+        client = _get_license_client()
         license_info = client.get_license_info(license_key)
         
         if license_info:
@@ -398,25 +507,39 @@ def get_seidit_license_info(license_key):
 
 # Server-side license generation (for SEIDiT use only)
 @frappe.whitelist()
+@seidit_admin_endpoint('License generation error')
 def generate_seidit_license(installation_id, customer_info):
     """Generate SEIDiT license (server-side only)"""
-    try:
-        # This should only be accessible by SEIDiT administrators
-        if not frappe.has_permission("System Manager"):
-            return {
-                'status': 'error',
-                'message': 'Unauthorized access',
-                'provider': 'SEIDiT'
-            }
-        
-        server = SEIDiTSecureLicenseServer()
-        result = server.generate_secure_license(installation_id, customer_info)
-        
-        return result
-        
-    except Exception as e:
-        return {
-            'status': 'error',
-            'message': f'License generation error: {str(e)}',
-            'provider': 'SEIDiT'
-        } 
\ No newline at end of file
+    return _get_license_server().generate_secure_license(installation_id, customer_info) 
+
+@frappe.whitelist()
+@seidit_admin_endpoint('Bulk license generation error')
+def generate_seidit_licenses_bulk(installations):
+    """
+    Generate SEIDiT licenses for a JSON list of {installation_id, customer_info}
+    
+    licenses holds one result per item, in order. The top-level status is
+    'success' when every item succeeded, 'error' when none did and 'partial'
+    otherwise, with failed counting the items that did not.
+    """
+    installations = loads(installations)
+    licenses = _get_license_server().generate_secure_licenses(
+        (item.get('installation_id'), item.get('customer_info'))
+        if isinstance(item, dict) else (None, None)
+        for item in installations
+    )
+    
+    failed = sum(1 for result in licenses if result['status'] != 'success')
+    if not failed:
+        status = 'success'
+    elif failed == len(licenses):
+        status = 'error'
+    else:
+        status = 'partial'
+    
+    return {
+        'status': status,
+        'licenses': licenses,
+        'failed': failed,
+        'provider': 'SEIDiT'
+    }
@@ -0,0 +1,59 @@
+"""
+SEIDiT Shared Helpers
+=====================
+
+JSON helpers and endpoint decorators shared by the SEIDiT license modules.
+Kept free of psutil and the other license module imports so any module can
+use them at import time.
+
+Copyright (c) 2024 SEIDiT (https://seidit.com)
+All rights reserved.
+"""
+
+import json
+import functools
+import frappe
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_compact(obj, sort_keys=False):
+    """Serialize to compact UTF-8 JSON bytes, with orjson when available"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False).encode()
+
+def loads(data):
+    """Parse JSON bytes or text, with orjson when available"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def seidit_admin_endpoint(error_message):
+    """
+    Decorator for SEIDiT administrator endpoints
+    
+    Rejects callers without System Manager before the endpoint body runs and
+    turns any exception, including one from the permission check, into the
+    standard SEIDiT error response.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                if not frappe.has_permission("System Manager"):
+                    return {
+                        'status': 'error',
+                        'message': 'Unauthorized access',
+                        'provider': 'SEIDiT'
+                    }
+                
+                return fn(*args, **kwargs)
+            except Exception as e:
+                return {
+                    'status': 'error',
+                    'message': f'{error_message}: {str(e)}',
+                    'provider': 'SEIDiT'
+                }
+        return wrapper
+    return decorator
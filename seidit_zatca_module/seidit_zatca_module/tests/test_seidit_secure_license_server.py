@@ -0,0 +1,66 @@
+"""
+Tests for SEIDiT bulk license generation
+
+Copyright (c) 2024 SEIDiT (https://seidit.com)
+All rights reserved.
+"""
+
+import json
+import unittest
+from unittest.mock import patch
+
+from seidit_zatca_module import seidit_secure_license_server
+
+class TestGenerateSEIDiTLicensesBulk(unittest.TestCase):
+    """generate_seidit_licenses_bulk reports each item's result"""
+
+    def setUp(self):
+        # A fresh server per test; skip the System Manager lookup, which needs a site
+        server = seidit_secure_license_server.SEIDiTSecureLicenseServer()
+        for patcher in (
+            patch.object(seidit_secure_license_server, '_get_license_server', return_value=server),
+            patch('frappe.has_permission', return_value=True)
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def generate(self, installations):
+        return seidit_secure_license_server.generate_seidit_licenses_bulk(json.dumps(installations))
+
+    def test_all_items_succeed(self):
+        result = self.generate([
+            {'installation_id': 'inst-1', 'customer_info': {'name': 'One'}},
+            {'installation_id': 'inst-2'}
+        ])
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['failed'], 0)
+        self.assertEqual([item['installation_id'] for item in result['licenses']], ['inst-1', 'inst-2'])
+
+    def test_mixed_batch_reports_partial(self):
+        result = self.generate([
+            {'installation_id': 'inst-1', 'customer_info': {'name': 'One'}},
+            {'customer_info': {'name': 'No installation'}},
+            'not an object',
+            {'installation_id': 'inst-4'}
+        ])
+        
+        self.assertEqual(result['status'], 'partial')
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual(
+            [item['status'] for item in result['licenses']],
+            ['success', 'error', 'error', 'success']
+        )
+        self.assertIn('installation_id is required', result['licenses'][1]['message'])
+
+    def test_failed_generation_is_reported(self):
+        # A payload that cannot be serialized fails inside generate_secure_license
+        with patch.object(seidit_secure_license_server, 'dumps_compact', side_effect=TypeError('bad payload')):
+            result = self.generate([{'installation_id': 'inst-1'}])
+        
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['failed'], 1)
+        self.assertIn('bad payload', result['licenses'][0]['message'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -106,6 +106,10 @@ class SEIDiTZATCAPhase2Module:
         }
         
         frappe.get_doc(log_entry).insert()
+        
+        # The free-trial status counts ZATCA Log rows
+        from seidit_license_system import clear_license_status_cache
+        clear_license_status_cache()
     
     def generate_invoice_xml(self, invoice):
         """Generate XML for ZATCA compliance with SEIDiT implementation"""
@@ -363,76 +367,21 @@ class SEIDiTZATCAPhase2Module:
 # ERPNext DocType Extensions
 def extend_sales_invoice():
     """Add SEIDiT ZATCA fields to Sales Invoice"""
-    custom_fields = [
-        {
-            'fieldname': 'zatca_status',
-            'label': 'ZATCA Status',
-            'fieldtype': 'Data',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_clearance_status',
-            'label': 'ZATCA Clearance Status',
-            'fieldtype': 'Data',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_reporting_status',
-            'label': 'ZATCA Reporting Status',
-            'fieldtype': 'Data',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_qr_code',
-            'label': 'ZATCA QR Code',
-            'fieldtype': 'Code',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_signature',
-            'label': 'ZATCA Signature',
-            'fieldtype': 'Code',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_xml_content',
-            'label': 'ZATCA XML Content',
-            'fieldtype': 'Code',
-            'read_only': 1
-        },
-        {
-            'fieldname': 'zatca_provider',
-            'label': 'ZATCA Provider',
-            'fieldtype': 'Data',
-            'read_only': 1,
-            'default': 'SEIDiT'
-        },
-        {
-            'fieldname': 'zatca_module_version',
-            'label': 'ZATCA Module Version',
-            'fieldtype': 'Data',
-            'read_only': 1
-        }
-    ]
-    
-    for field_config in custom_fields:
-        if not frappe.db.exists("Custom Field", f"Sales Invoice-{field_config['fieldname']}"):
-            frappe.get_doc({
-                'doctype': 'Custom Field',
-                'dt': 'Sales Invoice',
-                'fieldname': field_config['fieldname'],
-                'label': field_config['label'],
-                'fieldtype': field_config['fieldtype'],
-                'read_only': field_config['read_only'],
-                'default': field_config.get('default', '')
-            }).insert()
+    from seidit_zatca_module.install_seidit_complete import extend_sales_invoice as extend_sales_invoice_fields
+    extend_sales_invoice_fields()
+
+def _get_zatca():
+    """Return the SEIDiT ZATCA module for this request, building it once"""
+    zatca = getattr(frappe.local, 'seidit_zatca', None)
+    if zatca is None:
+        zatca = frappe.local.seidit_zatca = SEIDiTZATCAPhase2Module()
+    return zatca
 
 # API Endpoints for SEIDiT ZATCA Module
 @frappe.whitelist()
 def process_invoice_for_zatca(invoice_name):
     """API endpoint to process invoice for ZATCA with SEIDiT implementation"""
-    zatca = SEIDiTZATCAPhase2Module()
-    return zatca.process_invoice(invoice_name)
+    return _get_zatca().process_invoice(invoice_name)
 
 @frappe.whitelist()
 def get_zatca_status(invoice_name):
@@ -472,8 +421,7 @@ def on_sales_invoice_submit(doc, method):
     """Automatically process invoice when submitted with SEIDiT implementation"""
     if doc.docstatus == 1:  # Submitted
         try:
-            zatca = SEIDiTZATCAPhase2Module()
-            result = zatca.process_invoice(doc.name)
+            result = _get_zatca().process_invoice(doc.name)
             
             if result.get('status') == 'success':
                 frappe.msgprint('✅ SEIDiT ZATCA processing successful!')
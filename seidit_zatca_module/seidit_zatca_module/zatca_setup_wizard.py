@@ -19,6 +19,12 @@ import uuid
 from datetime import datetime
 import requests
 
+def default_settings_exist():
+    """Check for the Default ZATCA Settings record with a LIMIT 1 lookup"""
+    return bool(frappe.db.sql(
+        "SELECT 1 FROM `tabZATCA Settings` WHERE name=%s LIMIT 1", ("Default",)
+    ))
+
 class SEIDiTZATCASetupWizard:
     """
     SEIDiT ZATCA Setup Wizard
@@ -86,7 +92,7 @@ class SEIDiTZATCASetupWizard:
     def _get_current_settings(self):
         """Get current ZATCA settings"""
         try:
-            if frappe.db.exists("ZATCA Settings", "Default"):
+            if default_settings_exist():
                 settings = frappe.get_doc("ZATCA Settings", "Default")
                 return {
                     'company_tax_number': settings.company_tax_number,
@@ -170,7 +176,7 @@ class SEIDiTZATCASetupWizard:
     def update_settings(self, settings_data):
         """Update ZATCA settings"""
         try:
-            if not frappe.db.exists("ZATCA Settings", "Default"):
+            if not default_settings_exist():
                 # Create default settings
                 settings = frappe.get_doc({
                     'doctype': 'ZATCA Settings',
@@ -218,7 +224,7 @@ class SEIDiTZATCASetupWizard:
     def test_zatca_connection(self):
         """Test ZATCA API connection"""
         try:
-            if not frappe.db.exists("ZATCA Settings", "Default"):
+            if not default_settings_exist():
                 return {
                     'status': 'error',
                     'message': 'ZATCA settings not configured',
@@ -315,7 +321,7 @@ class SEIDiTZATCASetupWizard:
     def activate_live_mode(self):
         """Activate live mode"""
         try:
-            if not frappe.db.exists("ZATCA Settings", "Default"):
+            if not default_settings_exist():
                 return {
                     'status': 'error',
                     'message': 'ZATCA settings not configured',